@@ -1,19 +1,36 @@
 import os
 
-import eventlet
-import markdown
+# Monkey patching must happen before any other module is imported.
+# "gevent" is the default, "eventlet" is also supported. Real threads ("threading")
+# are not, because the rounds state is not thread-safe.
+ASYNC_MODE = os.environ.get("ASYNC_MODE", "gevent")
+
+if ASYNC_MODE == "gevent":
+    from gevent import monkey
+
+    monkey.patch_all()
+elif ASYNC_MODE == "eventlet":
+    import eventlet
+
+    eventlet.monkey_patch(thread=True, time=True)
+else:
+    raise ValueError(f"unsupported ASYNC_MODE: `{ASYNC_MODE}`")
+
+import functools
+import threading
+from datetime import datetime, timedelta
+
+import orjson
 from flask import Flask
 from flask.cli import load_dotenv
 from flask_apscheduler import APScheduler
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, emit, join_room
 
 from backend.models import DEFAULT_CONFIG_PATH, Config
 from cli.config import config
 from routes.index import index
 from routes.leaderboard import leaderboard, limiter
 
-eventlet.monkey_patch(thread=True, time=True)
-
 load_dotenv(".flaskenv")
 
 
@@ -32,6 +49,18 @@ class PrefixMiddleware(object):
             return ["This url does not belong to the app.".encode()]
 
 
+class OrjsonModule(object):
+    """Drop-in replacement for the json module, used to serialize Socket.IO packets."""
+
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__, template_folder="templates")
 
 
@@ -51,9 +80,8 @@ if app.debug and os.environ.get("FLASK_PROFILER", "0") == "1":
 app.wsgi_app = PrefixMiddleware(app.wsgi_app, prefix=os.environ["FLASK_STATIC_PATH"])
 
 config_path = app.config.get("CONFIG_PATH", DEFAULT_CONFIG_PATH)
-app.config["CONFIG"] = Config.parse_file(config_path)
+app.config["CONFIG"] = Config.parse_file_fast(config_path)
 app.config["CONFIG_PATH"] = config_path
-app.config["CONFIG_NEEDS_SAVE"] = False
 app.config["LIMITER"] = limiter
 
 app.config["SCHEDULER_API_ENABLE"] = True
@@ -72,20 +100,25 @@ app.register_blueprint(leaderboard, url_prefix="/leaderboard")
 app.cli.add_command(config)
 
 
+@functools.lru_cache(maxsize=1)
+def render_readme() -> str:
+    """Renders the README, only once as it does not change while the server runs."""
+    import markdown
+
+    with open("README.md", "r") as readme_file:
+        return markdown.markdown(readme_file.read(), extensions=["fenced_code"])
+
+
 @app.route("/")
 def _index():
-    readme_file = open("README.md", "r")
-    md_template_string = markdown.markdown(
-        readme_file.read(), extensions=["fenced_code"]
-    )
-
-    return md_template_string
+    return render_readme()
 
 
 if os.environ["FLASK_RUN_HOST"].lower() == "localhost":
     socketio = SocketIO(
         app,
-        async_mode="eventlet",
+        async_mode=ASYNC_MODE,
+        json=OrjsonModule,
     )
 
 else:
@@ -93,29 +126,86 @@ else:
         app,
         cors_allowed_origins=os.environ["FLASK_RUN_HOST"],
         path=os.environ["FLASK_STATIC_PATH"] + "/socket.io/",
-        async_mode="eventlet",
+        async_mode=ASYNC_MODE,
+        json=OrjsonModule,
     )
 
 
+LEADERBOARD_ROOM = "leaderboard"
+
+# Deltas are computed against the last update sent, so computing and emitting an
+# update must not interleave with another one, or clients may apply them out of order
+leaderboard_lock = threading.Lock()
+
+
 @socketio.on("connect")
-@scheduler.task("interval", id="update_client", seconds=1.0)
+def connect():
+    """Registers a new client and sends it the current leaderboard."""
+    join_room(LEADERBOARD_ROOM)
+
+    with leaderboard_lock:
+        emit(
+            "update_leaderboard",
+            app.config["CONFIG"].get_leaderboard_update(full=True),
+        )
+
+
+@scheduler.task("interval", id="heartbeat", seconds=5.0)
 def update_leaderboard():
-    """Updates periodically the leaderboard by fetching data from the submissions."""
-    with scheduler.app.app_context():
-        socketio.emit(
-            "update_leaderboard", app.config["CONFIG"].get_leaderboard_status().dict()
+    """
+    Updates the leaderboard by fetching data from the submissions.
+
+    This runs periodically as a heartbeat, at the start of every lap, and whenever
+    a route modifies the state of the leaderboard.
+    """
+    # No app context is needed: only the config and the socket are accessed
+    with leaderboard_lock:
+        leaderboard_update = app.config["CONFIG"].get_leaderboard_update()
+
+        # Nothing changed (e.g., paused), clients are already up to date
+        if leaderboard_update is not None:
+            socketio.emit("update_leaderboard", leaderboard_update, to=LEADERBOARD_ROOM)
+
+    rounds_config = app.config["CONFIG"].rounds_config
+
+    # Wake up right after the next lap starts, so that clients see it immediately
+    if not rounds_config.is_paused() and not rounds_config.is_finished():
+        scheduler.add_job(
+            "next_lap",
+            update_leaderboard,
+            trigger="date",
+            run_date=datetime.now()
+            + timedelta(seconds=rounds_config.time_before_next_lap() + 0.05),
+            replace_existing=True,
         )
 
 
-@scheduler.task("interval", id="save_config", seconds=5.0)
+app.config["UPDATE_LEADERBOARD"] = update_leaderboard
+
+
 def save_config():
-    """Saves periodically the config, if needed."""
-    with scheduler.app.app_context():
-        if app.config["CONFIG_NEEDS_SAVE"]:
-            app.config["CONFIG"].save_to(app.config["CONFIG_PATH"])
-            app.config["CONFIG_NEEDS_SAVE"] = False
+    """Saves the config, if it changed since last save."""
+    app.config["CONFIG"].save_to(app.config["CONFIG_PATH"], only_if_changed=True)
+
+
+def request_config_save():
+    """
+    Schedules a config save in a few seconds.
+
+    Requests made before the save happens are merged into a single save.
+    """
+    scheduler.add_job(
+        "save_config",
+        save_config,
+        trigger="date",
+        run_date=datetime.now() + timedelta(seconds=2.0),
+        replace_existing=True,
+    )
+
+
+app.config["REQUEST_CONFIG_SAVE"] = request_config_save
 
 
 if __name__ == "__main__":
     scheduler.start()
-    socketio.run(app, port=os.environ["FLASK_RUN_PORT"])
+    socketio.run(app, port=int(os.environ["FLASK_RUN_PORT"]))
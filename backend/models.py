@@ -1,11 +1,15 @@
+import functools
+import hashlib
+import itertools
 import random
 import time
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
 from secrets import token_bytes
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 
+import orjson
 from pydantic import (
     BaseModel,
     Extra,
@@ -18,6 +22,7 @@ from pydantic import (
     root_validator,
     validator,
 )
+from pydantic.json import pydantic_encoder
 
 DEFAULT_CONFIG_PATH = Path(".config.json")
 
@@ -46,12 +51,13 @@ class Guess(str, Enum):
     penalized = "penalized"
 
     @classmethod
-    def possible_values(self):
-        return [
+    @functools.lru_cache(maxsize=1)
+    def possible_values(cls) -> Tuple["Guess", ...]:
+        return tuple(
             guess
-            for guess in Guess
+            for guess in cls
             if guess not in [Guess.nothing, Guess.received, Guess.penalized]
-        ]
+        )
 
 
 class Answer(BaseModel):
@@ -106,8 +112,8 @@ class RoundsConfig(BaseModel):
     delay_before_playing: PositiveFloat = 2.0
     delay_after_playing: PositiveFloat = 1.0
     sound_duration: PositiveFloat = 5.0
-    __answers: List[List[Guess]] = PrivateAttr()
-    __play_delays: List[List[PositiveFloat]] = PrivateAttr()
+    __answers: Tuple[Tuple[str, ...], ...] = PrivateAttr()
+    __play_delays: Tuple[Tuple[float, ...], ...] = PrivateAttr()
     __round_start_time: float = PrivateAttr()
     __time_when_paused: float = PrivateAttr()
     __paused: bool = PrivateAttr()
@@ -115,8 +121,17 @@ class RoundsConfig(BaseModel):
     __current_lap: conint(ge=0) = PrivateAttr()
     __finished: bool = PrivateAttr()
     __submissions: List[Submission] = PrivateAttr([])
+    __round_snapshots: Dict[int, Dict[Tuple[str, int], Tuple[Guess, bool]]] = (
+        PrivateAttr({})
+    )
+    __submissions_by_round_key_lap: Dict[Tuple[int, str, int], List[Submission]] = (
+        PrivateAttr({})
+    )
+    # Penalized (round, key, lap), used to flag entries in the round snapshots
+    __penalized: Set[Tuple[int, str, int]] = PrivateAttr(set())
     __security_round_submissions: Dict[str, SecurityGuess] = PrivateAttr({})
     __await_next_round: bool = PrivateAttr(False)
+    __submissions_version: int = PrivateAttr(0)
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -159,6 +174,7 @@ class RoundsConfig(BaseModel):
         self.__security_round_submissions[key] = SecurityGuess(
             score=score, traces=traces, time=time.strftime("%H:%M")
         )
+        self.__submissions_version += 1
 
     def get_security_round_submission(self, key: str) -> Optional[SecurityGuess]:
         """
@@ -171,6 +187,73 @@ class RoundsConfig(BaseModel):
         Adds a new submissions to the list.
         """
         self.__submissions.append(submission)
+        self.__index_submission(submission)
+        self.__submissions_version += 1
+
+    def __index_submission(self, submission: Submission):
+        """
+        Adds a submission to the lookup indexes, keeping insertion order.
+        """
+        self.__submissions_by_round_key_lap.setdefault(
+            (submission.round, submission.key, submission.lap), []
+        ).append(submission)
+
+        if submission.penalized:
+            self.__penalized.add((submission.round, submission.key, submission.lap))
+
+        self.__update_round_snapshot(submission)
+
+    def __update_round_snapshot(self, submission: Submission):
+        """
+        Records a submission as the last one of its (key, lap) pair in its round.
+        """
+        self.__round_snapshots.setdefault(submission.round, {})[
+            (submission.key, submission.lap)
+        ] = (
+            submission.guess,
+            (submission.round, submission.key, submission.lap) in self.__penalized,
+        )
+
+    def __reindex_submissions(self):
+        """
+        Rebuilds the lookup indexes from the list of submissions.
+        """
+        self.__round_snapshots = {}
+        self.__submissions_by_round_key_lap = {}
+        self.__penalized = set()
+
+        for submission in self.__submissions:
+            self.__index_submission(submission)
+
+    def patch_last_submission(
+        self, key: str, round: int, lap: int, guess: Guess
+    ) -> Optional[Submission]:
+        """
+        Changes the guess of the last non-penalized submission made by a group for a
+        given round and lap.
+
+        If no such submission was made, None is returned.
+        """
+        submissions = self.__submissions_by_round_key_lap.get((round, key, lap), [])
+
+        for submission in reversed(submissions):
+            if submission.penalized:
+                continue
+
+            submission.guess = guess
+            # The patched submission is not necessarily the last one
+            self.__update_round_snapshot(submissions[-1])
+            self.__submissions_version += 1
+
+            return submission
+
+        return None
+
+    def get_submissions_version(self) -> int:
+        """
+        Returns a counter that is incremented every time submissions are modified.
+        """
+        return self.__submissions_version
 
     def get_submissions(
         self, key: str, round: Optional[int], lap: Optional[int]
@@ -180,15 +263,23 @@ class RoundsConfig(BaseModel):
 
         If no guesses were submitted, [Guess.nothing] is returned.
 
-        Guesses are sorted with earliest first, oldest last.
+        Guesses are sorted with most recent first, oldest last.
         """
-        guesses = (
-            submissions.guess
-            for submissions in self.__submissions[::-1]
-            if submissions.key == key
-            and (submissions.round == round or round is None)
-            and (submissions.lap == lap or lap is None)
-        )
+        if round is not None and lap is not None:
+            guesses = (
+                submissions.guess
+                for submissions in self.__submissions_by_round_key_lap.get(
+                    (round, key, lap), []
+                )[::-1]
+            )
+        else:
+            guesses = (
+                submissions.guess
+                for submissions in self.__submissions[::-1]
+                if submissions.key == key
+                and (submissions.round == round or round is None)
+                and (submissions.lap == lap or lap is None)
+            )
 
         return list(guesses) or [Guess.nothing]
 
@@ -197,7 +288,17 @@ class RoundsConfig(BaseModel):
     ) -> List[dict]:
         """
         Returns the submissions as dictonaries by a group for a given round and lap.
+
+        Submissions are sorted with oldest first, most recent last.
         """
+        if round is not None and lap is not None:
+            return [
+                submissions.dict()
+                for submissions in self.__submissions_by_round_key_lap.get(
+                    (round, key, lap), []
+                )
+            ]
+
         return list(
             submissions.dict()
             for submissions in self.__submissions
@@ -217,44 +318,43 @@ class RoundsConfig(BaseModel):
             and submissions.round != round
             and submissions.lap != lap
         ]
+        self.__reindex_submissions()
+        self.__submissions_version += 1
 
-    def get_last_submission(self, key: str, round: int, lap: int) -> Guess:
+    def get_round_snapshot(
+        self, round: int
+    ) -> Dict[Tuple[str, int], Tuple[Guess, bool]]:
         """
-        Returns the last guess submitted by a group for a given round and lap.
+        Returns, for each (key, lap) pair of a given round, the last guess submitted
+        and whether the group was penalized.
 
-        If no guesses were submitted, Guess.nothing is returned.
-        """
-        guesses = (
-            submissions.guess
-            for submissions in self.__submissions[::-1]
-            if submissions.key == key
-            and submissions.round == round
-            and submissions.lap == lap
-        )
-
-        return next(guesses, Guess.nothing)
+        Pairs without any submission are absent from the returned dictionary.
 
-    def is_penalized(self, key: str, round: int, lap: int) -> bool:
+        The snapshot is maintained as submissions are added, and must not be modified.
         """
-        Returns true if a group was penalized for a given round and lap.
-        """
-        return any(
-            submissions.penalized
-            for submissions in self.__submissions
-            if submissions.key == key
-            and submissions.round == round
-            and submissions.lap == lap
-        )
+        return self.__round_snapshots.get(round, {})
 
     def restart(self):
         self.__submissions.clear()
+        self.__reindex_submissions()
+        self.__submissions_version += 1
 
         possibles_answers = Guess.possible_values()
 
-        self.__answers = [
-            random.choices(possibles_answers, k=round_config.lap_count)
-            for round_config in self.rounds
+        # Random values are drawn for all laps at once, then split per round
+        lap_counts = [round_config.lap_count for round_config in self.rounds]
+        total_lap_count = sum(lap_counts)
+        ends = list(itertools.accumulate(lap_counts))
+        starts = [0] + ends[:-1]
+
+        # Answers are stored as plain strings for fast comparisons
+        answers = [
+            guess.value
+            for guess in random.choices(possibles_answers, k=total_lap_count)
         ]
+        self.__answers = tuple(
+            tuple(answers[begin:end]) for begin, end in zip(starts, ends)
+        )
         total = (
             self.latency_margin
             + self.delay_before_playing
@@ -263,13 +363,12 @@ class RoundsConfig(BaseModel):
         )
         start = self.delay_before_playing
 
-        self.__play_delays = [
-            [
-                start + random.random() * (round_config.lap_duration - total)
-                for _ in range(round_config.lap_count)
-            ]
-            for round_config in self.rounds
-        ]
+        windows = [round_config.lap_duration - total for round_config in self.rounds]
+        randoms = [random.random() for _ in range(total_lap_count)]
+        self.__play_delays = tuple(
+            tuple(start + r * window for r in randoms[begin:end])
+            for window, begin, end in zip(windows, starts, ends)
+        )
 
         self.__round_start_time = time.time()
         self.__time_when_paused = self.__round_start_time
@@ -360,17 +459,14 @@ class RoundsConfig(BaseModel):
 
         return int(current_lap)
 
-    def get_current_correct_guess(self) -> Guess:
-        return self.__answers[self.get_current_round()][self.get_current_lap()]
-
     def get_number_of_rounds(self) -> int:
         return len(self.rounds)
 
     def get_current_number_of_laps(self) -> int:
         return self.rounds[self.get_current_round()].lap_count
 
-    def get_current_round_answers(self) -> List[Guess]:
-        return self.__answers[self.get_current_round()]
+    def get_round_answers(self, round: int) -> Tuple[str, ...]:
+        return self.__answers[round]
 
     def is_paused(self) -> bool:
         return self.__paused
@@ -426,10 +522,21 @@ class LeaderboardStatus(BaseModel):
 class Config(BaseModel):
     group_configs: List[GroupConfig] = []
     rounds_config: RoundsConfig = RoundsConfig()
+    __rows_cache_key: Optional[tuple] = PrivateAttr(None)
+    __rows_cache: List[LeaderboardRow] = PrivateAttr([])
+    __groups_by_key: Dict[str, GroupConfig] = PrivateAttr({})
+    __groups_by_name: Dict[str, GroupConfig] = PrivateAttr({})
+    __last_leaderboard_status: Optional[dict] = PrivateAttr(None)
+    __last_saved_checksum: Optional[str] = PrivateAttr(None)
 
     class Config:
         extra = Extra.forbid
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.reindex_groups()
+
     @validator("group_configs")
     def unique_names_and_keys(cls, v):
         keys = set()
@@ -452,56 +559,153 @@ class Config(BaseModel):
     def clear(self):
         self.__submissions.clear()
 
-    def save_to(self, path: str):
-        with open(path, "w") as f:
-            f.write(self.json(indent=2))
+    def save_to(self, path: str, only_if_changed: bool = False) -> bool:
+        """
+        Saves the config to a file, and returns whether it was written.
+
+        If only_if_changed is set, nothing is written when the content is the same as
+        when the config was last saved or loaded.
+        """
+        content = orjson.dumps(
+            self.dict(), default=pydantic_encoder, option=orjson.OPT_INDENT_2
+        )
+        checksum = hashlib.sha256(content).hexdigest()
+
+        if only_if_changed and checksum == self.__last_saved_checksum:
+            return False
+
+        # No checksum is written: fields may have been modified without validation,
+        # so the file is only trusted once `parse_file_fast` has validated it
+        with open(path, "wb") as f:
+            f.write(content)
+
+        self.__last_saved_checksum = checksum
+
+        return True
+
+    @classmethod
+    def parse_file_fast(cls, path: str) -> "Config":
+        """
+        Parses a config file, skipping validation if the file is trusted.
+
+        A file is trusted if its SHA-256 checksum matches the one stored in
+        `<path>.sum`, which is written after the file was successfully validated.
+        """
+        with open(path, "rb") as f:
+            content = f.read()
+
+        checksum = hashlib.sha256(content).hexdigest()
 
-    def get_group_by_name(self, name: str) -> GroupConfig:
         try:
-            return next(
-                filter(
-                    lambda group_config: group_config.name == name, self.group_configs
-                )
+            with open(f"{path}.sum", "r") as f:
+                trusted = f.read() == checksum
+        except FileNotFoundError:
+            trusted = False
+
+        if not trusted:
+            config = cls.parse_raw(content)
+
+            with open(f"{path}.sum", "w") as f:
+                f.write(checksum)
+
+            config.__last_saved_checksum = checksum
+
+            return config
+
+        values = orjson.loads(content)
+        rounds_config_values = values.get("rounds_config", {})
+
+        if "rounds" in rounds_config_values:
+            rounds_config_values["rounds"] = [
+                RoundConfig.construct(**round_config)
+                for round_config in rounds_config_values["rounds"]
+            ]
+
+        if "security_round" in rounds_config_values:
+            # Bytes are saved as text
+            rounds_config_values["security_round"] = SecurityRound.construct(
+                key=rounds_config_values["security_round"]["key"].encode()
             )
-        except StopIteration:
+
+        rounds_config = RoundsConfig.construct(**rounds_config_values)
+        random.seed(rounds_config.seed)  # Normally done in RoundsConfig.__init__
+
+        config = cls.construct(
+            group_configs=[
+                GroupConfig.construct(**group_config)
+                for group_config in values.get("group_configs", [])
+            ],
+            rounds_config=rounds_config,
+        )
+        config.reindex_groups()  # Normally done in Config.__init__
+        config.__last_saved_checksum = checksum
+
+        return config
+
+    def reindex_groups(self):
+        """
+        Rebuilds the lookup tables of groups by key and by name.
+
+        Must be called whenever a group key or name is modified.
+        """
+        self.__groups_by_key = {
+            group_config.key: group_config for group_config in self.group_configs
+        }
+        self.__groups_by_name = {
+            group_config.name: group_config for group_config in self.group_configs
+        }
+
+    def get_group_by_name(self, name: str) -> GroupConfig:
+        try:
+            return self.__groups_by_name[name]
+        except KeyError:
             raise IndexError(f"name `{name}` not found")
 
     def get_group_by_key(self, key: str) -> GroupConfig:
         try:
-            return next(
-                filter(lambda group_config: group_config.key == key, self.group_configs)
-            )
-        except StopIteration:
+            return self.__groups_by_key[key]
+        except KeyError:
             raise IndexError(f"key `{key}` not found")
 
-    def get_leaderboard_status(self) -> LeaderboardStatus:
+    def invalidate_leaderboard_cache(self):
+        """
+        Forces the leaderboard rows to be recomputed on next status request.
+        """
+        self.__rows_cache_key = None
 
-        current_correct_guess = self.rounds_config.get_current_correct_guess()
-        current_with_noise = self.rounds_config.get_current_round_config().with_noise
-        current_round = self.rounds_config.get_current_round()
-        current_lap = self.rounds_config.get_current_lap()
-        number_of_rounds = self.rounds_config.get_number_of_rounds()
-        number_of_laps = self.rounds_config.get_current_number_of_laps()
-        paused = self.rounds_config.is_paused()
-        time_before_next_lap = self.rounds_config.time_before_next_lap()
-        time_before_playing = self.rounds_config.time_before_playing()
-        finished = self.rounds_config.is_finished()
+    def get_leaderboard_rows(
+        self, current_round: int, current_lap: int
+    ) -> List[LeaderboardRow]:
+        """
+        Returns the leaderboard rows for a given round, up to a given lap.
 
-        correct_answers = self.rounds_config.get_current_round_answers()
+        Rows are only recomputed if submissions, round or lap changed since last call.
+        """
+        cache_key = (
+            current_round,
+            current_lap,
+            self.rounds_config.get_submissions_version(),
+        )
+
+        if cache_key == self.__rows_cache_key:
+            return self.__rows_cache
 
+        correct_answers = self.rounds_config.get_round_answers(current_round)
+        round_config = self.rounds_config.rounds[current_round]
+        only_check_for_presence = round_config.only_check_for_presence
+        snapshot = self.rounds_config.get_round_snapshot(current_round)
+        no_submission = (Guess.nothing, False)
+
+        # Rows are built from trusted data, so validation is skipped
         rows = []
         for group_config in self.group_configs:
             answers = []
             score = 0.0
             for lap, correct_answer in enumerate(correct_answers):
                 # Getting last submission
-                guess = self.rounds_config.get_last_submission(
-                    group_config.key, current_round, lap
-                )
+                guess, penalized = snapshot.get((group_config.key, lap), no_submission)
 
-                if (
-                    self.rounds_config.get_current_round_config().only_check_for_presence
-                ):
+                if only_check_for_presence:
                     if guess != Guess.nothing:
                         guess = Guess.received
                         correct = True
@@ -516,9 +720,7 @@ class Config(BaseModel):
                 else:
                     status = Status.incorrect
 
-                if self.rounds_config.is_penalized(
-                    group_config.key, current_round, lap
-                ):
+                if penalized:
                     score -= 0.5
 
                     if correct:
@@ -528,10 +730,10 @@ class Config(BaseModel):
 
                 hide = lap > current_lap
 
-                answers.append(Answer(guess=guess, status=status, hide=hide))
+                answers.append(Answer.construct(guess=guess, status=status, hide=hide))
 
             rows.append(
-                LeaderboardRow(
+                LeaderboardRow.construct(
                     name=group_config.name,
                     answers=answers,
                     score=score,
@@ -541,8 +743,32 @@ class Config(BaseModel):
                 )
             )
 
-        return LeaderboardStatus(
-            round_name=self.rounds_config.get_current_round_config().name,
+        self.__rows_cache_key = cache_key
+        self.__rows_cache = rows
+
+        return rows
+
+    def get_leaderboard_status(self) -> LeaderboardStatus:
+        # Lap must be computed first, as it may move on to the next round
+        current_lap = self.rounds_config.get_current_lap()
+        current_round = self.rounds_config.get_current_round()
+        round_config = self.rounds_config.rounds[current_round]
+
+        correct_answers = self.rounds_config.get_round_answers(current_round)
+
+        current_correct_guess = Guess(correct_answers[current_lap])
+        current_with_noise = round_config.with_noise
+        number_of_rounds = self.rounds_config.get_number_of_rounds()
+        number_of_laps = round_config.lap_count
+        paused = self.rounds_config.is_paused()
+        time_before_next_lap = self.rounds_config.time_before_next_lap()
+        time_before_playing = self.rounds_config.time_before_playing()
+        finished = self.rounds_config.is_finished()
+
+        rows = self.get_leaderboard_rows(current_round, current_lap)
+
+        return LeaderboardStatus.construct(
+            round_name=round_config.name,
             current_correct_guess=current_correct_guess,
             current_with_noise=current_with_noise,
             current_round=current_round,
@@ -555,3 +781,83 @@ class Config(BaseModel):
             finished=finished,
             leaderboard=rows,
         )
+
+    def get_leaderboard_update(self, full: bool = False) -> Optional[dict]:
+        """
+        Returns the leaderboard status, as a dictionary to be sent to clients.
+
+        Unless the round changed, only the rows that changed since last call are sent,
+        under `changes`, and None is returned if nothing changed.
+
+        If full is set, the update is only meant for a single client (e.g., on
+        connect): a full update is returned, and the next deltas are unaffected.
+        """
+        status = self.get_leaderboard_status().dict()
+
+        if full:
+            return self.__full_leaderboard_update(status)
+
+        last_status = self.__last_leaderboard_status
+        self.__last_leaderboard_status = status
+
+        if (
+            last_status is None
+            or last_status["current_round"] != status["current_round"]
+            or len(last_status["leaderboard"]) != len(status["leaderboard"])
+        ):
+            return self.__full_leaderboard_update(status)
+
+        if last_status == status:
+            return None
+
+        changes = []
+        for index, (row, last_row) in enumerate(
+            zip(status["leaderboard"], last_status["leaderboard"])
+        ):
+            if row == last_row:
+                continue
+
+            change = {
+                field: row[field]
+                for field in ("name", "score", "security_round")
+                if row[field] != last_row[field]
+            }
+            change["index"] = index
+            change["answers"] = [
+                {"lap": lap, "answer": answer}
+                for lap, (answer, last_answer) in enumerate(
+                    zip(row["answers"], last_row["answers"])
+                )
+                if answer != last_answer
+            ]
+            changes.append(change)
+
+        update = {
+            field: value for field, value in status.items() if field != "leaderboard"
+        }
+        update["full"] = False
+        update["changes"] = changes
+
+        return update
+
+    @staticmethod
+    def __full_leaderboard_update(status: dict) -> dict:
+        """
+        Returns a full leaderboard update, where hidden answers carry no data.
+        """
+        update = {
+            field: value for field, value in status.items() if field != "leaderboard"
+        }
+        update["full"] = True
+        update["leaderboard"] = [
+            {
+                **row,
+                "answers": [
+                    {"hide": True} if answer["hide"] else answer
+                    for answer in row["answers"]
+                ],
+            }
+            for row in status["leaderboard"]
+        ]
+
+        return update
@@ -86,6 +86,8 @@ def generate_key(name: str, config_path: Path, size: int, force: bool):
     else:
         config.group_configs.append(GroupConfig(name=name, key=key))
 
+    config.reindex_groups()
+
     print(f"Group {name} now has key: {key}")
 
     config.save_to(config_path)
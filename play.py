@@ -60,10 +60,16 @@ def info(*args, **kwargs):
 def main(url, key, random_key):
     """Play "correct" sound according to the leaderboard status."""
 
+    # Reuse connections (and TLS sessions) between requests
+    session = requests.Session()
+    session.mount(
+        "https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4)
+    )
+
     # Wait for server to be up
     # and checks if admin rights
     while True:
-        response = requests.get(f"{url}/lelec2103/leaderboard/check/{key}")
+        response = session.get(f"{url}/lelec2103/leaderboard/check/{key}")
 
         code = response.status_code
 
@@ -71,7 +77,7 @@ def main(url, key, random_key):
             assert response.json()["admin"], "key must belong to an admin!"
 
             if random_key:
-                response = requests.get(
+                response = session.get(
                     f"{url}/lelec2103/leaderboard/check/{random_key}"
                 )
 
@@ -85,11 +91,21 @@ def main(url, key, random_key):
             info("Waiting server to be ready")
             time.sleep(0.2)
 
+    # Decoding WAV files takes time, so they are all loaded once
+    info("Loading sounds")
+    sounds = {
+        category: [
+            AudioSegment.from_file(sound_file, format="wav").normalize()
+            for sound_file in sound_files
+        ]
+        for category, sound_files in SOUND_FILES.items()
+    }
+
     played_sounds = set()
 
     while True:
         start = time.time()
-        json = requests.get(f"{url}/lelec2103/leaderboard/status/{key}").json()
+        json = session.get(f"{url}/lelec2103/leaderboard/status/{key}").json()
         delay = time.time() - start
         info(f"Took {delay:.4f}s for the status request")
 
@@ -116,7 +132,7 @@ def main(url, key, random_key):
 
         played_sounds.add(sound_key)
 
-        sound_file = random.choice(SOUND_FILES[category])
+        sound = random.choice(sounds[category])
 
         if time_before_playing < 0:
             info(f"Too late for playing: {category}")
@@ -126,7 +142,6 @@ def main(url, key, random_key):
         info(f"Playing sound in {time_before_playing}")
 
         start = time.time()
-        sound = AudioSegment.from_file(sound_file, format="wav").normalize()
 
         if with_noise:
             sound = sound.overlay(WhiteNoise().to_audio_segment(duration=len(sound), volume=-20.0 + current_lap))
@@ -138,11 +153,11 @@ def main(url, key, random_key):
         info("Playing sound now")
 
         # Admins are always correct :-)
-        requests.patch(f"{url}/lelec2103/leaderboard/submit/{key}/{category}")
+        session.patch(f"{url}/lelec2103/leaderboard/submit/{key}/{category}")
 
         if random_key:  # Random player
             guess = random.choice(CATEGORIES)
-            requests.patch(f"{url}/lelec2103/leaderboard/submit/{random_key}/{guess}")
+            session.patch(f"{url}/lelec2103/leaderboard/submit/{random_key}/{guess}")
 
         thread.join()
 
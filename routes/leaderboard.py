@@ -45,6 +45,7 @@ class Security(Resource):
             app.config["CONFIG"].rounds_config.add_security_round_submission(
                 key, guess_bytes, traces_int
             )
+            app.config["UPDATE_LEADERBOARD"]()
             return make_response(
                 jsonify(
                     {
@@ -106,33 +107,25 @@ class Submit(Resource):
 
             if not rounds_config.is_paused():
                 if flask.request.method == "PATCH":
-                    last = (
-                        Submission.query.filter_by(
-                            round=current_round,
-                            lap=current_lap,
-                            key=key,
-                            disqualified=False,
-                        )
-                        .order_by(Submission.timestamp.desc())
-                        .first()
+                    last = rounds_config.patch_last_submission(
+                        key, current_round, current_lap, guess
                     )
 
                     if last:
-                        last.guess = guess
-                        db.session.commit()
+                        app.config["UPDATE_LEADERBOARD"]()
                         return make_response(
                             jsonify(
                                 {
                                     "guess": guess,
                                     "round": current_round,
                                     "lap": current_lap,
-                                    "disqualified": last.disqualified,
+                                    "penalized": last.penalized,
                                 }
                             ),
                             200,
                         )
 
-                db.session.add(
+                rounds_config.add_submission(
                     Submission(
                         round=current_round,
                         lap=current_lap,
@@ -141,6 +134,7 @@ class Submit(Resource):
                         penalized=penalized,
                     )
                 )
+                app.config["UPDATE_LEADERBOARD"]()
                 return make_response(
                     jsonify(
                         {
@@ -247,6 +241,7 @@ class Submissions(Resource):
                 )
             elif flask.request.method == "DELETE":
                 rounds_config.delete_submissions(key=key, round=round, lap=lap)
+                app.config["UPDATE_LEADERBOARD"]()
                 return make_response(
                     jsonify(
                         {"method": flask.request.method, "round": round, "lap": lap}
@@ -365,6 +360,7 @@ class Play(Resource):
                 )
 
             app.config["CONFIG"].rounds_config.play()
+            app.config["UPDATE_LEADERBOARD"]()
 
             return make_response(
                 jsonify({"status": "playing"}),
@@ -402,6 +398,7 @@ class Pause(Resource):
                 )
 
             app.config["CONFIG"].rounds_config.pause()
+            app.config["UPDATE_LEADERBOARD"]()
 
             return make_response(
                 jsonify({"status": "paused"}),
@@ -439,6 +436,7 @@ class Restart(Resource):
                 )
 
             app.config["CONFIG"].rounds_config.restart()
+            app.config["UPDATE_LEADERBOARD"]()
 
             return make_response(
                 jsonify({"status": "restarted"}),
@@ -497,7 +495,10 @@ class Rename(Resource):
                 pass
 
             group_conf.name = name
-            app.config["CONFIG_NEEDS_SAVE"] = True
+            app.config["CONFIG"].reindex_groups()
+            app.config["CONFIG"].invalidate_leaderboard_cache()
+            app.config["REQUEST_CONFIG_SAVE"]()
+            app.config["UPDATE_LEADERBOARD"]()
 
             return make_response(jsonify({"name": name}), 200)
         except IndexError:
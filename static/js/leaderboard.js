@@ -22,6 +22,51 @@ const lapScrollStart = 4;
 
 let scrollDiff = 0;
 
+// Updates are only sent on changes, so the countdown is computed locally
+let countdown = {
+  timeBeforeNextLap: 0,
+  receivedAt: 0,
+  running: false,
+};
+
+setInterval(() => {
+  if (!countdown.running) {
+    return;
+  }
+
+  let elapsed = (performance.now() - countdown.receivedAt) / 1000;
+  let remaining = Math.max(0, countdown.timeBeforeNextLap - elapsed);
+  let elem = document.getElementById("time_before_next_lap");
+
+  if (elem !== null) {
+    elem.textContent = remaining.toFixed(1);
+  }
+}, 100);
+
+// Apply a partial update (only changed rows and answers) on top of the last state
+function applyChanges(client, message) {
+  let leaderboard = client.leaderboard;
+
+  for (const change of message.changes) {
+    let row = leaderboard[change.index];
+
+    for (const field of ["name", "score", "security_round"]) {
+      if (field in change) {
+        row[field] = change[field];
+      }
+    }
+
+    for (const { lap, answer } of change.answers) {
+      row.answers[lap] = answer;
+    }
+  }
+
+  message.leaderboard = leaderboard;
+  delete message.changes;
+
+  return message;
+}
+
 // Populate leaderboard callback
 socket.on("update_leaderboard", (message) => {
   // Retrieve state from local storage if it exists
@@ -35,6 +80,14 @@ socket.on("update_leaderboard", (message) => {
     };
   }
 
+  if (!message.full) {
+    // A full update is always sent on connect, so this should not happen
+    if (state.client === null) {
+      return;
+    }
+    message = applyChanges(state.client, message);
+  }
+
   if (
     state.client != null &&
     message.current_lap != null &&
@@ -65,6 +118,10 @@ socket.on("update_leaderboard", (message) => {
   });
   destination.innerHTML = compiledHtml;
 
+  countdown.timeBeforeNextLap = state.client.time_before_next_lap;
+  countdown.receivedAt = performance.now();
+  countdown.running = !state.client.paused && !state.client.finished;
+
   // Update scrollElem /!\ recompiling the template resets the scroll position
   let scrollElem = document.getElementById("leaderboard_wrapper");
   scrollElem.scrollBy({